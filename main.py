@@ -9,7 +9,17 @@
 import os
 import sys
 import argparse
+import hashlib
+import io
+import json
 import math
+import multiprocessing
+import multiprocessing.connection
+import shutil
+import re
+import socket
+import threading
+import uuid
 import numpy as np
 from PIL import Image, ImageEnhance, ImageFilter, ImageOps, ImageDraw
 import time
@@ -126,7 +136,10 @@ DEFAULTS = {
     'sharpen_percent': 150,
     'sharpen_threshold': 3,
     'circle_cut': False,
-    'heart_cut': False
+    'heart_cut': False,
+    'autocrop': False,
+    'head_speed': 10.0,
+    'line_interval': 300
 }
 
 def threshold_type(value):
@@ -174,6 +187,217 @@ def non_negative_int_type(value):
         raise argparse.ArgumentTypeError(f"'{value}' must be greater than or equal to 0.")
     return ivalue
 
+def dark_pixel_mask(img):
+    # Boolean array that is True wherever the laser will fire (opaque black pixels)
+    if img.mode == '1':
+        return ~np.asarray(img)
+    if img.mode == 'P':
+        # Classify each palette entry once, then look the indices up
+        palette = np.array(img.getpalette(), dtype=float).reshape(-1, 3)
+        dark = palette @ np.array([0.299, 0.587, 0.114]) < 128
+        if 'transparency' in img.info and isinstance(img.info['transparency'], int):
+            dark[img.info['transparency']] = False
+        lut = np.zeros(256, dtype=bool)
+        lut[:len(dark)] = dark
+        return lut[np.asarray(img)]
+    la = np.asarray(img.convert('LA'))
+    return (la[..., 0] < 128) & (la[..., 1] > 0)
+
+def dark_bbox(img, margin=0):
+    # Bounding box (left, top, right, bottom) of all dark pixels, or None for a blank image
+    dark = dark_pixel_mask(img)
+    rows = np.flatnonzero(dark.any(axis=1))
+    cols = np.flatnonzero(dark.any(axis=0))
+    if rows.size == 0:
+        return None
+    h, w = dark.shape
+    return (
+        max(int(cols[0]) - margin, 0),
+        max(int(rows[0]) - margin, 0),
+        min(int(cols[-1]) + 1 + margin, w),
+        min(int(rows[-1]) + 1 + margin, h)
+    )
+
+def analyze_bitmap(img, head_speed=10.0, line_interval=300):
+    # The head sweeps the full raster width on every scan line, including pure-white rows and columns
+    dark = dark_pixel_mask(img)
+    h, w = dark.shape
+    dark_pixels = int(np.count_nonzero(dark))
+    active_rows = int(np.count_nonzero(dark.any(axis=1)))
+    
+    width_in = w / 300.0
+    height_in = h / 300.0
+    scan_lines = math.ceil(height_in * line_interval)
+    
+    return {
+        'width_px': w,
+        'height_px': h,
+        'dark_pixels': dark_pixels,
+        'coverage': dark_pixels / float(w * h) if w * h else 0.0,
+        'active_rows': active_rows,
+        'scan_lines': scan_lines,
+        'estimated_seconds': scan_lines * width_in / head_speed
+    }
+
+def format_duration(seconds):
+    minutes, secs = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}h {minutes:02d}m {secs:02d}s"
+    if minutes:
+        return f"{minutes}m {secs:02d}s"
+    return f"{secs}s"
+
+# --- Atkinson Dithering ---
+# Columns a wavefront worker processes between progress updates; the row below trails by this plus the kernel reach
+WAVEFRONT_BLOCK = 256
+
+def atkinson_dither(img_array, dither_thresh=128):
+    h, w = img_array.shape
+    
+    # Pad array: 1 column left, 2 columns right, 2 rows bottom to avoid boundary checks
+    padded = np.pad(img_array, ((0, 2), (1, 2)), mode='constant', constant_values=0.0)
+    
+    # Convert to nested list to avoid NumPy 2D indexing overhead in the loop
+    lst = padded.tolist()
+    
+    for y in range(h):
+        row_y = lst[y]
+        row_y1 = lst[y + 1]
+        row_y2 = lst[y + 2]
+        for x in range(1, w + 1):
+            old_pixel = row_y[x]
+            new_pixel = 255.0 if old_pixel > dither_thresh else 0.0
+            row_y[x] = new_pixel
+            
+            error = old_pixel - new_pixel
+            error_eighth = error * 0.125
+            
+            row_y[x + 1] += error_eighth
+            row_y[x + 2] += error_eighth
+            row_y1[x - 1] += error_eighth
+            row_y1[x] += error_eighth
+            row_y1[x + 1] += error_eighth
+            row_y2[x] += error_eighth
+            
+    return np.array(lst, dtype=float)[0:h, 1:w + 1]
+
+def effective_dither_workers(dither_workers):
+    # Wavefront processes beyond the CPU count only wait on each other, so callers cap the request here.
+    # atkinson_dither_wavefront itself takes any count so its ordering stays testable on small machines.
+    return max(1, min(dither_workers, os.cpu_count() or 1))
+
+def _atkinson_wavefront_worker(shared, published, h, w, first_row, step, dither_thresh, block):
+    padded = np.frombuffer(shared, dtype=np.float64).reshape(h + 2, w + 3)
+    # Each worker releases one token on its own semaphore per finished block. Row y-1 always belongs to the
+    # previous worker, and both walk their rows in the same order, so the n-th token taken from upstream is
+    # the n-th block of the row above. sem_post never blocks the publisher (unlike Condition.notify_all,
+    # which waits for every sleeper to wake), and the post/wait pair is the memory barrier for the cells.
+    own = published[first_row % step]
+    upstream = published[(first_row - 1) % step]
+    
+    for y in range(first_row, h, step):
+        blocks_above = 0
+        for c0 in range(0, w, block):
+            c1 = min(c0 + block, w)
+            
+            # Pixel x receives error from x-1..x+1 one row up, so the row above must be finished through
+            # column c1+2 before this block is read. That row in turn waited on the one above it, which keeps
+            # every cell's additions in the same order as the sequential kernel.
+            if y > 0:
+                needed_blocks = -(-min(w, c1 + 3) // block)
+                while blocks_above < needed_blocks:
+                    upstream.acquire()
+                    blocks_above += 1
+                    
+            # Work on list copies of the cells this block touches (padded column = pixel column + 1);
+            # no other worker writes to them until this block is published.
+            row_y = padded[y, c0 + 1:c1 + 3].tolist()
+            row_y1 = padded[y + 1, c0:c1 + 2].tolist()
+            row_y2 = padded[y + 2, c0 + 1:c1 + 1].tolist()
+            for i in range(c1 - c0):
+                old_pixel = row_y[i]
+                new_pixel = 255.0 if old_pixel > dither_thresh else 0.0
+                row_y[i] = new_pixel
+                
+                error = old_pixel - new_pixel
+                error_eighth = error * 0.125
+                
+                row_y[i + 1] += error_eighth
+                row_y[i + 2] += error_eighth
+                row_y1[i] += error_eighth
+                row_y1[i + 1] += error_eighth
+                row_y1[i + 2] += error_eighth
+                row_y2[i] += error_eighth
+                
+            padded[y, c0 + 1:c1 + 3] = row_y
+            padded[y + 1, c0:c1 + 2] = row_y1
+            padded[y + 2, c0 + 1:c1 + 1] = row_y2
+            own.release()
+
+def wavefront_block_for(w, workers):
+    # A worker starts its next row only after finishing its current one, while the row above that next row
+    # is just one block ahead of it; every worker stays busy only if a row has at least as many blocks as there
+    # are workers. Narrow images get smaller blocks (down to 32 columns) so that holds with some slack.
+    return max(32, min(WAVEFRONT_BLOCK, -(-w // (2 * workers))))
+
+def atkinson_dither_wavefront(img_array, dither_thresh=128, workers=2, block=None):
+    # Rows are dealt round-robin to worker processes sharing one buffer; each row trails the row above it
+    # by a fixed column lag, so rows are dithered concurrently with output bit-identical to atkinson_dither
+    h, w = img_array.shape
+    workers = min(workers, h)
+    if workers <= 1:
+        return atkinson_dither(img_array, dither_thresh)
+    if block is None:
+        block = wavefront_block_for(w, workers)
+        
+    ctx = multiprocessing.get_context()
+    shared = ctx.RawArray('d', (h + 2) * (w + 3))
+    padded = np.frombuffer(shared, dtype=np.float64).reshape(h + 2, w + 3)
+    padded[:h, 1:w + 1] = img_array
+    published = [ctx.Semaphore(0) for _ in range(workers)]
+    
+    processes = [
+        ctx.Process(target=_atkinson_wavefront_worker, args=(shared, published, h, w, k, workers, dither_thresh, block))
+        for k in range(workers)
+    ]
+    for p in processes:
+        p.start()
+        
+    # Wait on the process sentinels rather than join() in order: a worker that dies (exception, OOM kill)
+    # never publishes its rows, so the workers below it would wait forever and so would a plain join
+    running = list(processes)
+    while running:
+        multiprocessing.connection.wait([p.sentinel for p in running])
+        for p in [p for p in running if not p.is_alive()]:
+            p.join()
+            running.remove(p)
+            if p.exitcode != 0:
+                for other in running:
+                    other.terminate()
+                for other in running:
+                    other.join()
+                raise RuntimeError(f"Wavefront dithering worker failed (exit code {p.exitcode}).")
+        
+    return padded[0:h, 1:w + 1].copy()
+
+# --- Cutout Output ---
+# Cutouts are 3-colour palette images (saved as 2-bit PNGs with a tRNS entry) instead of RGBA:
+# a 1 byte per pixel canvas plus the 1-bit outside mask in memory, and a fraction of the file size of a 4-channel PNG
+CUTOUT_TRANSPARENT = 0
+CUTOUT_BLACK = 1
+CUTOUT_WHITE = 2
+CUTOUT_PALETTE = [255, 255, 255, 0, 0, 0, 255, 255, 255]
+
+def cutout_canvas(bitmap):
+    # Palette copy of a 1-bit bitmap: black -> CUTOUT_BLACK, white -> CUTOUT_WHITE, nothing transparent yet.
+    # Built in Pillow alone (the bitmap's white pixels are the paste mask), so no full-size temporaries are made.
+    cut_img = Image.new('P', bitmap.size, CUTOUT_BLACK)
+    cut_img.paste(CUTOUT_WHITE, mask=bitmap)
+    cut_img.putpalette(CUTOUT_PALETTE)
+    cut_img.info['transparency'] = CUTOUT_TRANSPARENT
+    return cut_img
+
 def transform_image(
     img, 
     black_thresh=0, 
@@ -192,8 +416,52 @@ def transform_image(
     sharpen_percent=150,
     sharpen_threshold=3,
     circle_cut=False,
-    heart_cut=False
+    heart_cut=False,
+    autocrop=False,
+    dither_workers=1,
+    report=None
 ):
+    gray = prepare_grayscale(img, denoise_radius=denoise_radius)
+    return render_bitmap(
+        gray,
+        black_thresh=black_thresh,
+        white_thresh=white_thresh,
+        dither_thresh=dither_thresh,
+        clean_solids=clean_solids,
+        clean_solids_black=clean_solids_black,
+        clean_solids_white=clean_solids_white,
+        invert=invert,
+        width_in=width_in,
+        height_in=height_in,
+        no_border=no_border,
+        contrast=contrast,
+        sharpen_radius=sharpen_radius,
+        sharpen_percent=sharpen_percent,
+        sharpen_threshold=sharpen_threshold,
+        circle_cut=circle_cut,
+        heart_cut=heart_cut,
+        autocrop=autocrop,
+        dither_workers=dither_workers,
+        report=report
+    )
+
+def target_size_for(size, width_in=None, height_in=None):
+    # Pixel size at 300 DPI for the requested physical width/height, keeping the aspect ratio if only one is given
+    if not (width_in or height_in):
+        return size
+    orig_w, orig_h = size
+    target_w = int(width_in * 300) if width_in else None
+    target_h = int(height_in * 300) if height_in else None
+    
+    if target_w and not target_h:
+        target_h = int(orig_h * (target_w / float(orig_w)))
+    elif target_h and not target_w:
+        target_w = int(orig_w * (target_h / float(orig_h)))
+        
+    return (target_w, target_h)
+
+def prepare_grayscale(img, denoise_radius=0):
+    # Size-independent stages, shared by every output size of a source image
     # 1. Apply EXIF orientation
     img = ImageOps.exif_transpose(img)
     
@@ -210,82 +478,100 @@ def transform_image(
     if denoise_radius > 0:
         img = img.filter(ImageFilter.MedianFilter(size=denoise_radius))
         
+    return img
+
+def render_bitmap(
+    img, 
+    black_thresh=0, 
+    white_thresh=255, 
+    dither_thresh=128, 
+    clean_solids=False, 
+    clean_solids_black=35,
+    clean_solids_white=220,
+    invert=False, 
+    width_in=None, 
+    height_in=None, 
+    no_border=False,
+    contrast=1.5,
+    sharpen_radius=2.0,
+    sharpen_percent=150,
+    sharpen_threshold=3,
+    circle_cut=False,
+    heart_cut=False,
+    autocrop=False,
+    dither_workers=1,
+    report=None
+):
+    # Per-size stages, starting from the grayscale image returned by prepare_grayscale
+    # report: optional dict that receives which shortcuts were taken (e.g. 'bilevel_fast_path')
     # 4. Handle Resize if requested (calculated at 300 DPI)
     if width_in or height_in:
-        orig_w, orig_h = img.size
-        target_w = int(width_in * 300) if width_in else None
-        target_h = int(height_in * 300) if height_in else None
-        
-        if target_w and not target_h:
-            target_h = int(orig_h * (target_w / float(orig_w)))
-        elif target_h and not target_w:
-            target_w = int(orig_w * (target_h / float(orig_h)))
-            
-        img = img.resize((target_w, target_h), Image.Resampling.LANCZOS)
+        img = img.resize(target_size_for(img.size, width_in, height_in), Image.Resampling.LANCZOS)
         
     if invert:
         img = ImageOps.invert(img)
         
-    # 5. Pre-process Thresholds
-    img_array = np.array(img, dtype=float)
-    if clean_solids:
-        img_array[img_array < clean_solids_black] = 0
-        img_array[img_array > clean_solids_white] = 255
+    # 4.5 Fast path for inputs that are already pure black and white (line art, 2-colour exports).
+    # Thresholds, contrast >= 1, unsharp masking and dithering all map 0 and 255 onto themselves,
+    # so skipping them gives an identical bitmap.
+    histogram = img.histogram()
+    bilevel = (
+        sum(histogram[1:255]) == 0
+        and contrast >= 1.0
+        and dither_thresh < 255
+        and black_thresh < 255
+        and white_thresh > 0
+    )
+    if report is not None:
+        report['bilevel_fast_path'] = bilevel
         
-    if black_thresh > 0:
-        img_array[img_array <= black_thresh] = 0
-    if white_thresh < 255:
-        img_array[img_array >= white_thresh] = 255
+    if bilevel:
+        final_img = img.convert('1', dither=Image.Dither.NONE)
+    else:
+        # 5. Pre-process Thresholds
+        img_array = np.array(img, dtype=float)
+        if clean_solids:
+            img_array[img_array < clean_solids_black] = 0
+            img_array[img_array > clean_solids_white] = 255
         
-    img = Image.fromarray(np.uint8(img_array))
-    
-    # 6. High Contrast / Levels
-    enhancer = ImageEnhance.Contrast(img)
-    img = enhancer.enhance(contrast)
-    
-    # 7. Unsharp Mask
-    img = img.filter(ImageFilter.UnsharpMask(radius=sharpen_radius, percent=sharpen_percent, threshold=sharpen_threshold))
-    
-    # 8. Atkinson Dithering Implementation
-    img_array = np.array(img, dtype=float)
-    h, w = img_array.shape
-    
-    # Pad array: 1 column left, 2 columns right, 2 rows bottom to avoid boundary checks
-    padded = np.pad(img_array, ((0, 2), (1, 2)), mode='constant', constant_values=0.0)
-    
-    # Convert to nested list to avoid NumPy 2D indexing overhead in the loop
-    lst = padded.tolist()
+        if black_thresh > 0:
+            img_array[img_array <= black_thresh] = 0
+        if white_thresh < 255:
+            img_array[img_array >= white_thresh] = 255
+        
+        img = Image.fromarray(np.uint8(img_array))
+        
+        # 6. High Contrast / Levels
+        enhancer = ImageEnhance.Contrast(img)
+        img = enhancer.enhance(contrast)
+        
+        # 7. Unsharp Mask
+        img = img.filter(ImageFilter.UnsharpMask(radius=sharpen_radius, percent=sharpen_percent, threshold=sharpen_threshold))
+        
+        # 8. Atkinson Dithering Implementation
+        img_array = np.array(img, dtype=float)
+        workers = effective_dither_workers(dither_workers)
+        if workers > 1:
+            final_arr = atkinson_dither_wavefront(img_array, dither_thresh, workers=workers)
+        else:
+            final_arr = atkinson_dither(img_array, dither_thresh)
+        final_img = Image.fromarray(np.uint8(np.clip(final_arr, 0, 255))).convert('1')
     
-    for y in range(h):
-        row_y = lst[y]
-        row_y1 = lst[y + 1]
-        row_y2 = lst[y + 2]
-        for x in range(1, w + 1):
-            old_pixel = row_y[x]
-            new_pixel = 255.0 if old_pixel > dither_thresh else 0.0
-            row_y[x] = new_pixel
-            
-            error = old_pixel - new_pixel
-            error_eighth = error * 0.125
-            
-            row_y[x + 1] += error_eighth
-            row_y[x + 2] += error_eighth
-            row_y1[x - 1] += error_eighth
-            row_y1[x] += error_eighth
-            row_y1[x + 1] += error_eighth
-            row_y2[x] += error_eighth
-            
-    final_arr = np.array(lst, dtype=float)[0:h, 1:w + 1]
-    final_img = Image.fromarray(np.uint8(np.clip(final_arr, 0, 255))).convert('1')
+    # 8.5 Trim fully white margins (the border is drawn on the cropped edges below)
+    if autocrop and not (circle_cut or heart_cut):
+        margin = 0 if no_border else 1
+        bbox = dark_bbox(final_img, margin=margin)
+        if bbox:
+            final_img = final_img.crop(bbox)
     
     # 9. Add 1px Black Border / Coaster Cutout (unless disabled)
     w, h = final_img.size
     if circle_cut:
-        rgba_img = final_img.convert('RGBA')
+        cut_img = cutout_canvas(final_img)
         
-        # Create alpha mask (0 = transparent outside circle)
-        mask = Image.new('L', (w, h), 0)
-        draw_mask = ImageDraw.Draw(mask)
+        # Mask of everything outside the circle
+        outside = Image.new('1', (w, h), 1)
+        draw_mask = ImageDraw.Draw(outside)
         
         diameter = min(w, h)
         left = (w - diameter) // 2
@@ -293,22 +579,26 @@ def transform_image(
         right = left + diameter - 1
         bottom = top + diameter - 1
         
-        # Draw opaque circle
-        draw_mask.ellipse([left, top, right, bottom], fill=255)
-        rgba_img.putalpha(mask)
+        # Make everything outside the circle transparent
+        draw_mask.ellipse([left, top, right, bottom], fill=0)
+        cut_img.paste(CUTOUT_TRANSPARENT, mask=outside)
         
         # Draw the black circular outline for Glowforge cut path
         if not no_border:
-            draw_rgba = ImageDraw.Draw(rgba_img)
-            draw_rgba.ellipse([left, top, right, bottom], outline=(0, 0, 0, 255), width=1)
+            draw_cut = ImageDraw.Draw(cut_img)
+            draw_cut.ellipse([left, top, right, bottom], outline=CUTOUT_BLACK, width=1)
             
-        final_img = rgba_img
+        final_img = cut_img
+        
+        # Trim the transparent margins around the cut shape (the transparent index is 0, so getbbox finds the shape)
+        if autocrop:
+            final_img = final_img.crop(final_img.getbbox())
     elif heart_cut:
-        rgba_img = final_img.convert('RGBA')
+        cut_img = cutout_canvas(final_img)
         
-        # Create alpha mask (0 = transparent outside heart)
-        mask = Image.new('L', (w, h), 0)
-        draw_mask = ImageDraw.Draw(mask)
+        # Mask of everything outside the heart
+        outside = Image.new('1', (w, h), 1)
+        draw_mask = ImageDraw.Draw(outside)
         
         cx = w / 2.0
         cy = h * 0.46  # Shift slightly upward to center the heart visually
@@ -329,22 +619,460 @@ def transform_image(
             py = cy + y * scale_y
             points.append((px, py))
             
-        # Draw opaque heart on mask
-        draw_mask.polygon(points, fill=255)
-        rgba_img.putalpha(mask)
+        # Make everything outside the heart transparent
+        draw_mask.polygon(points, fill=0)
+        cut_img.paste(CUTOUT_TRANSPARENT, mask=outside)
         
         # Draw the black heart outline for Glowforge cut path
         if not no_border:
-            draw_rgba = ImageDraw.Draw(rgba_img)
-            draw_rgba.polygon(points, outline=(0, 0, 0, 255), width=1)
+            draw_cut = ImageDraw.Draw(cut_img)
+            draw_cut.polygon(points, outline=CUTOUT_BLACK, width=1)
             
-        final_img = rgba_img
+        final_img = cut_img
+        
+        # Trim the transparent margins around the cut shape (the transparent index is 0, so getbbox finds the shape)
+        if autocrop:
+            final_img = final_img.crop(final_img.getbbox())
     elif not no_border:
         draw = ImageDraw.Draw(final_img)
         draw.rectangle([0, 0, w - 1, h - 1], outline=0, width=1)
         
     return final_img
 
+# --- Atomic Output ---
+def _temp_path_for(output_path):
+    # Hidden temp name in the destination folder so the final rename stays on one filesystem. Only a name is
+    # reserved (unique per host, process and call); the file is created by its writer so it gets the normal
+    # umask-based permissions instead of mkstemp's owner-only 0600, which os.replace would carry over.
+    directory, filename = os.path.split(output_path)
+    return os.path.join(directory, f".{filename}.{socket.gethostname()}.{os.getpid()}.{uuid.uuid4().hex}.tmp")
+
+def save_atomic(img, output_path):
+    # Readers (and other workers) only ever see a missing or a complete file, never a partial PNG
+    tmp_path = _temp_path_for(output_path)
+    try:
+        img.save(tmp_path, format='PNG', dpi=(300, 300))
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def link_atomic(target_path, output_path, expected_hash=None):
+    # Returns False (and leaves output_path alone) if expected_hash is given and the target no longer has it
+    tmp_path = _temp_path_for(output_path)
+    try:
+        try:
+            os.link(target_path, tmp_path)
+        except OSError:
+            # Hard links are not available (e.g. across devices), fall back to a plain copy
+            shutil.copyfile(target_path, tmp_path)
+        # Check the temp link rather than target_path: it pins the inode that gets published, so a target
+        # replaced by another writer right after this check cannot slip in
+        if expected_hash is not None and file_bitmap_hash(tmp_path) != expected_hash:
+            os.remove(tmp_path)
+            return False
+        os.replace(tmp_path, output_path)
+        return True
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+# --- Output Deduplication ---
+MANIFEST_FILENAME = 'manifest.json'
+MANIFEST_LOCK_FILENAME = 'manifest.json.lock'
+# Manifest updates take milliseconds, so a lock this old was left behind by a crashed worker
+MANIFEST_LOCK_STALE_SECONDS = 30
+
+def bitmap_hash(img):
+    # Content hash of the final bitmap (mode, size and raw pixel data), independent of PNG encoding
+    digest = hashlib.sha256()
+    digest.update(f"{img.mode}:{img.size[0]}x{img.size[1]}:".encode())
+    digest.update(img.tobytes())
+    return digest.hexdigest()
+
+def file_bitmap_hash(path):
+    # bitmap_hash of a saved output, or None if it is missing or unreadable
+    try:
+        with Image.open(path) as img:
+            return bitmap_hash(img)
+    except (OSError, ValueError):
+        return None
+
+def _read_manifest(output_dir):
+    manifest_path = os.path.join(output_dir, MANIFEST_FILENAME)
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, 'r') as f:
+        return json.load(f)
+
+def load_dedup_store(output_dir):
+    files = _read_manifest(output_dir)
+    
+    # Only files that still exist on disk can be used as link targets
+    by_hash = {}
+    for rel_path, digest in files.items():
+        if digest not in by_hash and os.path.isfile(os.path.join(output_dir, rel_path)):
+            by_hash[digest] = rel_path
+            
+    return {'root': output_dir, 'files': files, 'by_hash': by_hash, 'written': set()}
+
+def _acquire_manifest_lock(root):
+    # Same link() trick as queue leases: the lock only appears once, fully written, and only one creator wins.
+    # A lock older than MANIFEST_LOCK_STALE_SECONDS belongs to a crashed worker and is broken.
+    lock_path = os.path.join(root, MANIFEST_LOCK_FILENAME)
+    token = f"{socket.gethostname()}.{os.getpid()}.{uuid.uuid4().hex}"
+    tmp_path = f"{lock_path}.{token}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({'holder': token, 'time': time.time()}, f)
+    delay = 0.01
+    try:
+        while True:
+            try:
+                os.link(tmp_path, lock_path)
+                return token
+            except FileExistsError:
+                pass
+            current = _read_marker(lock_path)
+            try:
+                locked_at = json.loads(current)['time'] if current is not None else None
+            except (ValueError, KeyError):
+                locked_at = 0
+            if locked_at is not None and time.time() - locked_at > MANIFEST_LOCK_STALE_SECONDS:
+                stale_path = f"{lock_path}.{token}.stale"
+                try:
+                    os.rename(lock_path, stale_path)
+                except FileNotFoundError:
+                    continue
+                if _read_marker(stale_path) != current:
+                    # A fresh lock replaced the stale one before our rename; put it back
+                    try:
+                        os.link(stale_path, lock_path)
+                    except FileExistsError:
+                        pass
+                os.remove(stale_path)
+                continue
+            time.sleep(delay)
+            delay = min(delay * 2, 0.5)
+    finally:
+        os.remove(tmp_path)
+
+def _release_manifest_lock(root, token):
+    lock_path = os.path.join(root, MANIFEST_LOCK_FILENAME)
+    current = _read_marker(lock_path)
+    try:
+        holder = json.loads(current).get('holder') if current is not None else None
+    except ValueError:
+        holder = None
+    if holder == token:
+        os.remove(lock_path)
+
+def save_dedup_store(store):
+    # Merge with the manifest on disk so concurrent workers sharing an output folder keep each other's entries.
+    # The read-merge-replace runs under a lock file, otherwise two workers could both read the old manifest
+    # and the second rename would drop the first worker's entries.
+    manifest_path = os.path.join(store['root'], MANIFEST_FILENAME)
+    token = _acquire_manifest_lock(store['root'])
+    try:
+        files = _read_manifest(store['root'])
+        files.update({rel_path: store['files'][rel_path] for rel_path in store['written']})
+        tmp_path = f"{manifest_path}.{token}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(files, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, manifest_path)
+    finally:
+        _release_manifest_lock(store['root'], token)
+
+def store_deduplicated(store, final_img, output_path):
+    # Returns the manifest path of the stored copy this output was linked to, or None if it was written fresh
+    rel_path = os.path.relpath(output_path, store['root'])
+    digest = bitmap_hash(final_img)
+    
+    # This name is about to be replaced, so it can no longer serve as the stored copy of its old content
+    previous = store['files'].get(rel_path)
+    if previous is not None and store['by_hash'].get(previous) == rel_path:
+        del store['by_hash'][previous]
+        
+    store['files'][rel_path] = digest
+    store['written'].add(rel_path)
+    
+    # Outputs are replaced by rename, so an existing hard link is never written through. The manifest can be
+    # stale (a run without --dedup or another worker may have replaced the target since), so the target's
+    # content is re-hashed before linking; that costs a PNG decode, far less than rendering.
+    target = store['by_hash'].get(digest)
+    if target is not None:
+        target_path = os.path.join(store['root'], target)
+        if os.path.isfile(target_path) and link_atomic(target_path, output_path, expected_hash=digest):
+            return target
+        # Stop offering the stale copy and record what the file really holds now
+        del store['by_hash'][digest]
+        actual = file_bitmap_hash(target_path)
+        if actual is not None:
+            store['files'][target] = actual
+            store['written'].add(target)
+            store['by_hash'].setdefault(actual, target)
+    
+    save_atomic(final_img, output_path)
+    store['by_hash'][digest] = rel_path
+    return None
+
+# --- Shared-Directory Work Queue ---
+# One append-only journal file per worker: O_APPEND is not atomic across NFS clients, so workers never share a file
+JOURNAL_DIRNAME = 'journal'
+
+def default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+def job_key(output_dir, *output_paths):
+    # Keyed on the output paths relative to the output folder, so nodes may mount the share at different paths
+    rel_paths = [os.path.relpath(p, output_dir).replace(os.sep, '/') for p in output_paths]
+    return hashlib.sha256('\n'.join(rel_paths).encode()).hexdigest()[:32]
+
+def safe_worker_id(worker_id):
+    # The id becomes part of journal, lease-temp and stale-lease file names, so path separators and other
+    # unusual characters are replaced once here
+    return re.sub(r'[^A-Za-z0-9._-]', '_', worker_id)
+
+def open_work_queue(queue_dir, worker_id=None, lease_seconds=600):
+    os.makedirs(os.path.join(queue_dir, 'leases'), exist_ok=True)
+    os.makedirs(os.path.join(queue_dir, JOURNAL_DIRNAME), exist_ok=True)
+    queue = {
+        'dir': queue_dir,
+        'worker_id': safe_worker_id(worker_id or default_worker_id()),
+        'lease_seconds': lease_seconds,
+        'completed': set(),
+        'journal_offsets': {}
+    }
+    refresh_completed(queue)
+    return queue
+
+def journal_path(queue):
+    return os.path.join(queue['dir'], JOURNAL_DIRNAME, f"{queue['worker_id']}.jsonl")
+
+def refresh_completed(queue):
+    # Merge entries appended to every worker's journal since the last refresh, ignoring a trailing
+    # partial line from a crashed writer
+    journal_dir = os.path.join(queue['dir'], JOURNAL_DIRNAME)
+    for filename in os.listdir(journal_dir):
+        if not filename.endswith('.jsonl'):
+            continue
+        offset = queue['journal_offsets'].get(filename, 0)
+        with open(os.path.join(journal_dir, filename), 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+        end = data.rfind(b'\n') + 1
+        for line in data[:end].splitlines():
+            try:
+                queue['completed'].add(json.loads(line)['key'])
+            except (ValueError, KeyError):
+                continue
+        queue['journal_offsets'][filename] = offset + end
+    return queue['completed']
+
+def _lease_path(queue, key):
+    return os.path.join(queue['dir'], 'leases', f"{key}.lease")
+
+def _read_marker(path):
+    try:
+        with open(path, 'r') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+def _create_lease(queue, key):
+    # Write the lease under a private name, then link it into place: link() fails atomically if a lease exists
+    lease_path = _lease_path(queue, key)
+    lease = json.dumps({'worker': queue['worker_id'], 'expires': time.time() + queue['lease_seconds']})
+    tmp_path = f"{lease_path}.{queue['worker_id']}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(lease)
+    try:
+        os.link(tmp_path, lease_path)
+        return True
+    except FileExistsError:
+        return False
+    finally:
+        os.remove(tmp_path)
+
+def claim_job(queue, key):
+    if _create_lease(queue, key):
+        return True
+        
+    lease_path = _lease_path(queue, key)
+    current = _read_marker(lease_path)
+    if current is None:
+        return _create_lease(queue, key)
+    try:
+        lease = json.loads(current)
+    except ValueError:
+        # Half-written lease of a crashed worker; treat it as expired
+        lease = {'worker': None, 'expires': 0}
+        
+    # Our own lease (restart under the same worker id) or an expired one can be taken over
+    if lease.get('worker') != queue['worker_id'] and lease.get('expires', 0) > time.time():
+        return False
+        
+    # Move the stale lease aside; only one worker can win this rename
+    stale_path = f"{lease_path}.{queue['worker_id']}.stale"
+    try:
+        os.rename(lease_path, stale_path)
+    except FileNotFoundError:
+        return False
+    try:
+        if _read_marker(stale_path) != current:
+            # Another worker already replaced the stale lease with a fresh one; put it back untouched
+            try:
+                os.link(stale_path, lease_path)
+            except FileExistsError:
+                pass
+            return False
+    finally:
+        os.remove(stale_path)
+    return _create_lease(queue, key)
+
+def renew_job(queue, key):
+    # Push our lease's expiry forward; returns False if the lease was lost (e.g. taken over after a long stall)
+    lease_path = _lease_path(queue, key)
+    current = _read_marker(lease_path)
+    try:
+        owner = json.loads(current).get('worker') if current is not None else None
+    except ValueError:
+        owner = None
+    if owner != queue['worker_id']:
+        return False
+    lease = json.dumps({'worker': queue['worker_id'], 'expires': time.time() + queue['lease_seconds']})
+    tmp_path = f"{lease_path}.{queue['worker_id']}.renew"
+    with open(tmp_path, 'w') as f:
+        f.write(lease)
+    os.replace(tmp_path, lease_path)
+    return True
+
+def start_lease_heartbeat(queue, key):
+    # Renew the lease from a background thread every third of its lifetime so a slow file (huge source,
+    # many sizes) is never taken over while still being worked on. Call the returned function to stop it; it waits
+    # for an in-flight renewal so the lease can't be rewritten after release_job removed it, and returns False
+    # if the lease was lost at any point (another worker may then have processed the same file).
+    stop = threading.Event()
+    lost = threading.Event()
+    interval = max(queue['lease_seconds'] / 3, 0.01)
+    
+    def still_held():
+        # A worker checking a stale-looking lease moves it aside for a moment, so retry once before giving up
+        if renew_job(queue, key):
+            return True
+        time.sleep(min(interval, 1.0))
+        return renew_job(queue, key)
+        
+    def check():
+        try:
+            if not still_held():
+                lost.set()
+                print(f"Warning: lost the lease for {key}; another worker may be processing the same file.", file=sys.stderr)
+        except OSError as e:
+            print(f"Warning: could not renew lease for {key}: {e}", file=sys.stderr)
+    
+    def beat():
+        while not stop.wait(interval) and not lost.is_set():
+            check()
+                
+    thread = threading.Thread(target=beat, name=f"lease-{key[:12]}", daemon=True)
+    thread.start()
+    
+    def stop_heartbeat():
+        # Safe to call more than once; the first call also covers the time since the last renewal
+        if not stop.is_set():
+            stop.set()
+            thread.join()
+            if not lost.is_set():
+                check()
+        return not lost.is_set()
+        
+    return stop_heartbeat
+
+def release_job(queue, key):
+    lease_path = _lease_path(queue, key)
+    current = _read_marker(lease_path)
+    if current is None:
+        return
+    try:
+        owner = json.loads(current).get('worker')
+    except ValueError:
+        owner = None
+    if owner == queue['worker_id']:
+        try:
+            os.remove(lease_path)
+        except FileNotFoundError:
+            pass
+
+def complete_job(queue, key, output_paths):
+    entry = json.dumps({'key': key, 'outputs': output_paths, 'worker': queue['worker_id'], 'time': time.time()})
+    
+    # Only this worker writes to its journal, so entries from different nodes can never overwrite each other
+    fd = os.open(journal_path(queue), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, (entry + '\n').encode())
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    queue['completed'].add(key)
+
+# --- Multi-Frame Sources ---
+MULTI_FRAME_EXTENSIONS = ('.tif', '.tiff', '.gif', '.webp')
+
+def count_frames(input_path):
+    if not input_path.lower().endswith(MULTI_FRAME_EXTENSIONS):
+        return 1
+    try:
+        with Image.open(input_path) as img:
+            return getattr(img, 'n_frames', 1)
+    except Exception:
+        # Unreadable files are reported when they are processed
+        return 1
+
+def open_frame(input_path, frame, source_path=None, source=None):
+    # Reuses the open source for the same file, so walking frames in order seeks forward one frame at a time
+    # instead of re-decoding (GIF/WebP) or re-scanning (TIFF) from the first frame. Returns (source_path, source).
+    if source is None or source_path != input_path or source.tell() > frame:
+        if source is not None:
+            source.close()
+        source_path, source = input_path, Image.open(input_path)
+    source.seek(frame)
+    return source_path, source
+
+def resolve_sizes(width_in, height_in):
+    # -w/-h each take one or more values; a single value is paired with every value of the other option
+    widths = list(width_in) if isinstance(width_in, (list, tuple)) else [width_in]
+    heights = list(height_in) if isinstance(height_in, (list, tuple)) else [height_in]
+    if len(widths) == 1:
+        widths = widths * len(heights)
+    elif len(heights) == 1:
+        heights = heights * len(widths)
+    if len(widths) != len(heights):
+        raise ValueError(f"Got {len(widths)} widths and {len(heights)} heights; give the same number of each, or a single value for one of them.")
+    return list(dict.fromkeys(zip(widths, heights)))
+
+def dim_suffix_for(width_in, height_in, orig_size):
+    if not (width_in or height_in):
+        return ""
+    if orig_size is None:
+        fw = width_in if width_in else "auto"
+        fh = height_in if height_in else "auto"
+        return f"_w{fw}h{fh}"
+        
+    orig_w, orig_h = orig_size
+    final_w_in = width_in
+    final_h_in = height_in
+    
+    if final_w_in and not final_h_in:
+        final_h_in = round((orig_h / orig_w) * final_w_in, 2)
+    elif final_h_in and not final_w_in:
+        final_w_in = round((orig_w / orig_h) * final_h_in, 2)
+    
+    fw = int(final_w_in) if final_w_in == int(final_w_in) else final_w_in
+    fh = int(final_h_in) if final_h_in == int(final_h_in) else final_h_in
+    return f"_w{fw}h{fh}"
+
 def prep_for_glowforge(
     input_path, 
     output_path, 
@@ -364,14 +1092,16 @@ def prep_for_glowforge(
     sharpen_percent=150,
     sharpen_threshold=3,
     circle_cut=False,
-    heart_cut=False
+    heart_cut=False,
+    autocrop=False,
+    head_speed=10.0,
+    line_interval=300,
+    dedup_store=None,
+    dither_workers=1
 ):
-    print(f"Processing {input_path} (Black: {black_thresh}, White: {white_thresh}, Dither: {dither_thresh}, Clean Solids: {clean_solids}, Invert: {invert}, W: {width_in}, H: {height_in}, No Border: {no_border}, Denoise: {denoise_radius}, Contrast: {contrast}, Sharpen Radius: {sharpen_radius}, Circle Cut: {circle_cut}, Heart Cut: {heart_cut})...")
-    start_time = time.time()
-    
-    img = Image.open(input_path)
-    final_img = transform_image(
-        img,
+    return prep_sizes_for_glowforge(
+        input_path,
+        [(output_path, width_in, height_in)],
         black_thresh=black_thresh,
         white_thresh=white_thresh,
         dither_thresh=dither_thresh,
@@ -379,8 +1109,6 @@ def prep_for_glowforge(
         clean_solids_black=clean_solids_black,
         clean_solids_white=clean_solids_white,
         invert=invert,
-        width_in=width_in,
-        height_in=height_in,
         no_border=no_border,
         denoise_radius=denoise_radius,
         contrast=contrast,
@@ -388,15 +1116,372 @@ def prep_for_glowforge(
         sharpen_percent=sharpen_percent,
         sharpen_threshold=sharpen_threshold,
         circle_cut=circle_cut,
-        heart_cut=heart_cut
+        heart_cut=heart_cut,
+        autocrop=autocrop,
+        head_speed=head_speed,
+        line_interval=line_interval,
+        dedup_store=dedup_store,
+        dither_workers=dither_workers
     )
+
+def prep_sizes_for_glowforge(
+    input_path, 
+    outputs, 
+    black_thresh=0, 
+    white_thresh=255, 
+    dither_thresh=128, 
+    clean_solids=False, 
+    clean_solids_black=35,
+    clean_solids_white=220,
+    invert=False, 
+    no_border=False,
+    denoise_radius=0,
+    contrast=1.5,
+    sharpen_radius=2.0,
+    sharpen_percent=150,
+    sharpen_threshold=3,
+    circle_cut=False,
+    heart_cut=False,
+    autocrop=False,
+    head_speed=10.0,
+    line_interval=300,
+    dedup_store=None,
+    img=None,
+    dither_workers=1
+):
+    # outputs: list of (output_path, width_in, height_in); the source is decoded and preprocessed once for all of them
+    # img: an already opened image (e.g. a frame of a multi-frame source) to use instead of opening input_path
+    widths = [width_in for _, width_in, _ in outputs]
+    heights = [height_in for _, _, height_in in outputs]
+    if len(outputs) == 1:
+        widths, heights = widths[0], heights[0]
+    if img is None:
+        img = Image.open(input_path)
+    frame_count = getattr(img, 'n_frames', 1)
+    source_label = f"{input_path} [frame {img.tell() + 1}/{frame_count}]" if frame_count > 1 else input_path
+    print(f"Processing {source_label} (Black: {black_thresh}, White: {white_thresh}, Dither: {dither_thresh}, Clean Solids: {clean_solids}, Invert: {invert}, W: {widths}, H: {heights}, No Border: {no_border}, Denoise: {denoise_radius}, Contrast: {contrast}, Sharpen Radius: {sharpen_radius}, Circle Cut: {circle_cut}, Heart Cut: {heart_cut}, Autocrop: {autocrop})...")
+    start_time = time.time()
     
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    final_img.save(output_path, dpi=(300, 300))
+    source_size = img.size
+    gray = prepare_grayscale(img, denoise_radius=denoise_radius)
     
-    print(f"Complete. Saved to {output_path} in {round(time.time() - start_time, 2)} seconds.")
+    results = []
+    for output_path, width_in, height_in in outputs:
+        report = {}
+        final_img = render_bitmap(
+            gray,
+            black_thresh=black_thresh,
+            white_thresh=white_thresh,
+            dither_thresh=dither_thresh,
+            clean_solids=clean_solids,
+            clean_solids_black=clean_solids_black,
+            clean_solids_white=clean_solids_white,
+            invert=invert,
+            width_in=width_in,
+            height_in=height_in,
+            no_border=no_border,
+            contrast=contrast,
+            sharpen_radius=sharpen_radius,
+            sharpen_percent=sharpen_percent,
+            sharpen_threshold=sharpen_threshold,
+            circle_cut=circle_cut,
+            heart_cut=heart_cut,
+            autocrop=autocrop,
+            dither_workers=dither_workers,
+            report=report
+        )
+        if report.get('bilevel_fast_path'):
+            print("Input is already bilevel: skipped contrast, sharpening and dithering.")
+        
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        if dedup_store is not None:
+            linked_to = store_deduplicated(dedup_store, final_img, output_path)
+        else:
+            linked_to = None
+            save_atomic(final_img, output_path)
+        
+        if linked_to:
+            print(f"Complete. Identical to {linked_to}, linked to {output_path} in {round(time.time() - start_time, 2)} seconds.")
+        else:
+            print(f"Complete. Saved to {output_path} in {round(time.time() - start_time, 2)} seconds.")
+        
+        stats = analyze_bitmap(final_img, head_speed=head_speed, line_interval=line_interval)
+        print(f"Engrave estimate: {stats['coverage']:.1%} dark coverage, {stats['active_rows']}/{stats['height_px']} active rows, ~{format_duration(stats['estimated_seconds'])} at {head_speed} in/s and {line_interval} LPI.")
+        
+        results.append({
+            'path': output_path,
+            'width': final_img.size[0],
+            'height': final_img.size[1],
+            'bytes': os.path.getsize(output_path),
+            'linked_to': linked_to,
+            'bilevel_fast_path': report.get('bilevel_fast_path', False),
+            'estimated_engrave_seconds': round(stats['estimated_seconds'], 2)
+        })
+        
+    return {
+        'width': source_size[0],
+        'height': source_size[1],
+        'outputs': results,
+        'output_bytes': sum(r['bytes'] for r in results)
+    }
+
+# --- Run Metrics ---
+DURATION_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+def log_record(run_log, record):
+    # One JSON object per line, flushed immediately so a killed run still leaves a usable log
+    run_log.write(json.dumps(record, sort_keys=True) + '\n')
+    run_log.flush()
+
+def read_prometheus_textfile(path):
+    # Sample values of an earlier textfile, keyed by series (name plus labels); empty if there is none yet
+    samples = {}
+    try:
+        with open(path, 'r') as f:
+            for line in f:
+                if line.startswith('#') or not line.strip():
+                    continue
+                series, _, value = line.rstrip('\n').rpartition(' ')
+                try:
+                    samples[series] = float(value)
+                except ValueError:
+                    continue
+    except FileNotFoundError:
+        pass
+    return samples
+
+def _format_sample(value):
+    return str(int(value)) if float(value).is_integer() else str(round(value, 6))
+
+def write_prometheus_textfile(path, records, run_started):
+    ok = [r for r in records if r['error'] is None]
+    failed = [r for r in records if r['error'] is not None]
+    durations = [r['duration'] for r in records]
+    
+    # Counters and the histogram must never go down between scrapes, so this run's values are added to the
+    # totals already in the file. Deleting the file resets them, which Prometheus handles as a counter reset.
+    previous = read_prometheus_textfile(path)
+    
+    def cumulative(series, value):
+        return f'{series} {_format_sample(previous.get(series, 0) + value)}'
+        
+    lines = [
+        '# HELP glowforge_files_processed_total Files successfully converted.',
+        '# TYPE glowforge_files_processed_total counter',
+        cumulative('glowforge_files_processed_total', len(ok)),
+        '# HELP glowforge_files_failed_total Files that failed to convert.',
+        '# TYPE glowforge_files_failed_total counter',
+        cumulative('glowforge_files_failed_total', len(failed)),
+        '# HELP glowforge_input_bytes_total Bytes read from source images.',
+        '# TYPE glowforge_input_bytes_total counter',
+        cumulative('glowforge_input_bytes_total', sum(r["input_bytes"] or 0 for r in records)),
+        '# HELP glowforge_output_bytes_total Bytes written to output bitmaps.',
+        '# TYPE glowforge_output_bytes_total counter',
+        cumulative('glowforge_output_bytes_total', sum(r["output_bytes"] or 0 for r in ok)),
+        '# HELP glowforge_file_duration_seconds Per-file processing latency.',
+        '# TYPE glowforge_file_duration_seconds histogram'
+    ]
+    for bucket in DURATION_BUCKETS:
+        lines.append(cumulative(f'glowforge_file_duration_seconds_bucket{{le="{bucket}"}}', sum(1 for d in durations if d <= bucket)))
+    lines.extend([
+        cumulative('glowforge_file_duration_seconds_bucket{le="+Inf"}', len(durations)),
+        cumulative('glowforge_file_duration_seconds_sum', sum(durations)),
+        cumulative('glowforge_file_duration_seconds_count', len(durations)),
+        '# HELP glowforge_last_run_timestamp_seconds Unix time the last run finished.',
+        '# TYPE glowforge_last_run_timestamp_seconds gauge',
+        f'glowforge_last_run_timestamp_seconds {round(time.time(), 3)}',
+        '# HELP glowforge_last_run_duration_seconds Wall-clock duration of the last run.',
+        '# TYPE glowforge_last_run_duration_seconds gauge',
+        f'glowforge_last_run_duration_seconds {round(time.time() - run_started, 3)}'
+    ])
+    
+    # The textfile collector may read at any moment, so never expose a half-written file
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    os.replace(tmp_path, path)
 
 # --- Execution ---
+def find_input_files(input_dir):
+    # Supported images under input_dir (or input_dir itself if it is a file); None if the path is unusable
+    supported_extensions = ('.png', '.jpg', '.jpeg', '.bmp') + MULTI_FRAME_EXTENSIONS
+    
+    if not os.path.exists(input_dir):
+        print(f"Error: Input path '{input_dir}' does not exist.", file=sys.stderr)
+        return None
+        
+    if not os.path.isdir(input_dir):
+        if input_dir.lower().endswith(supported_extensions):
+            return [input_dir]
+        print(f"Error: Input path '{input_dir}' is not a directory or supported image file.", file=sys.stderr)
+        return None
+        
+    input_files = []
+    for root, _, filenames in os.walk(input_dir):
+        for f in filenames:
+            if f.lower().endswith(supported_extensions):
+                input_files.append(os.path.join(root, f))
+    return input_files
+
+def collect_jobs(input_files):
+    # Each frame of a multi-frame source is its own job; frames are only counted here, never decoded
+    jobs = []
+    for input_path in input_files:
+        frame_count = count_frames(input_path)
+        if frame_count > 1:
+            jobs.extend((input_path, frame, frame_count) for frame in range(frame_count))
+        else:
+            jobs.append((input_path, None, 1))
+    return jobs
+
+# --- Preflight Planning ---
+# Per-pixel costs used to rank jobs for scheduling. They are fixed so every worker sharing a queue derives the
+# same order; --plan replaces them with timings measured on the current machine.
+DEFAULT_COST_MODEL = {'source_seconds_per_pixel': 3e-8, 'target_seconds_per_pixel': 1e-7, 'dither_seconds_per_pixel': 4e-7}
+
+# Peak bytes per target pixel in render_bitmap: float64 array, its padded copy, the nested list used by the
+# dither loop (8 byte slot + 24 byte float object) and the float64 result array
+RENDER_BYTES_PER_PIXEL = 8 + 8 + 32 + 8
+# With --dither-workers the nested list is replaced by a shared padded buffer: float64 array, shared buffer, result copy
+WAVEFRONT_RENDER_BYTES_PER_PIXEL = 8 + 8 + 8
+
+def read_source_headers(input_path, frame_count=1):
+    # One (size, mode, has_alpha) per frame, with EXIF rotation applied to the size; reads headers only
+    with Image.open(input_path) as img:
+        rotated = img.getexif().get(274) in (5, 6, 7, 8)
+        
+        def header():
+            w, h = img.size
+            has_alpha = img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info)
+            return ((h, w) if rotated else (w, h), img.mode, has_alpha)
+            
+        # TIFF pages can differ in size and seeking them only walks page headers;
+        # GIF/WebP frames share one canvas and seeking them would decode
+        if frame_count > 1 and input_path.lower().endswith(('.tif', '.tiff')):
+            headers = []
+            for frame in range(frame_count):
+                img.seek(frame)
+                headers.append(header())
+            return headers
+        return [header()] * frame_count
+
+def estimate_job(header, sizes, cost_model=DEFAULT_COST_MODEL, denoise_radius=0, dither_workers=1):
+    size, mode, has_alpha = header
+    source_px = size[0] * size[1]
+    targets = [target_size_for(size, w, h) for w, h in sizes]
+    target_px = [tw * th for tw, th in targets]
+    
+    # Decoded source (Pillow keeps multi-band modes at 4 bytes per pixel), the RGBA copies made while
+    # compositing transparency, and the grayscale image (plus the median filter's output with --denoise);
+    # all stay alive while each size is rendered. Cutout masks are built after the dither buffers are freed,
+    # so they never raise the peak; their time is part of the calibrated per-pixel cost.
+    decoded_bytes = 1 if mode in ('1', 'L', 'P') else 2 if mode.startswith('I;16') else 4
+    source_bytes = source_px * (decoded_bytes + (12 if has_alpha else 0) + 1 + (1 if denoise_radius > 0 else 0))
+    render_bytes = WAVEFRONT_RENDER_BYTES_PER_PIXEL if effective_dither_workers(dither_workers) > 1 else RENDER_BYTES_PER_PIXEL
+    
+    return {
+        'source_size': size,
+        'source_px': source_px,
+        'targets': targets,
+        'target_px': sum(target_px),
+        'memory_bytes': source_bytes + max(target_px) * render_bytes,
+        'seconds': source_px * cost_model['source_seconds_per_pixel'] + sum(target_px) * (cost_model['target_seconds_per_pixel'] + cost_model['dither_seconds_per_pixel'])
+    }
+
+def estimate_jobs(jobs, sizes, cost_model=DEFAULT_COST_MODEL, denoise_radius=0, dither_workers=1):
+    # Same order as jobs; a file whose header cannot be read gets None and is reported when processed
+    headers = {}
+    estimates = []
+    for input_path, frame, frame_count in jobs:
+        if input_path not in headers:
+            try:
+                headers[input_path] = read_source_headers(input_path, frame_count)
+            except Exception:
+                headers[input_path] = None
+        file_headers = headers[input_path]
+        estimates.append(estimate_job(file_headers[frame or 0], sizes, cost_model, denoise_radius, dither_workers) if file_headers else None)
+    return estimates
+
+def schedule_largest_first(jobs, sizes):
+    # Longest predicted jobs first (ties keep path/frame order), so one large file started last cannot hold up the batch
+    estimates = estimate_jobs(jobs, sizes)
+    order = sorted(
+        range(len(jobs)),
+        key=lambda i: (-(estimates[i]['seconds'] if estimates[i] else 0.0), i)
+    )
+    return [jobs[i] for i in order]
+
+def calibrate_cost_model(sample_size=256, denoise_radius=0, dither_workers=1, **render_settings):
+    # Times decode + preprocessing and the per-size stages on a synthetic sample to get per-pixel costs for this
+    # machine, using the run's own settings (denoise, contrast, sharpening, cutouts, dither workers).
+    # render_settings: render_bitmap keyword arguments other than the size and dither_workers.
+    rng = np.random.default_rng(0)
+    sample = Image.fromarray(rng.integers(0, 256, (sample_size, sample_size, 3), dtype=np.uint8))
+    buf = io.BytesIO()
+    sample.save(buf, format='PNG')
+    pixels = float(sample_size * sample_size)
+    
+    start = time.perf_counter()
+    buf.seek(0)
+    gray = prepare_grayscale(Image.open(buf), denoise_radius=denoise_radius)
+    source_seconds = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    render_bitmap(gray, **render_settings)
+    render_seconds = time.perf_counter() - start
+    
+    # The dither stage is timed on its own and taken out of the render time, so the configured kernel can be
+    # measured in its place. The wavefront's speedup grows with row width, so it is timed on a strip as wide
+    # as a typical output instead of the square sample.
+    dither_sample = rng.random((sample_size, sample_size)) * 255.0
+    start = time.perf_counter()
+    atkinson_dither(dither_sample)
+    sequential_dither_seconds = time.perf_counter() - start
+    dither_seconds_per_pixel = sequential_dither_seconds / pixels
+    workers = effective_dither_workers(dither_workers)
+    if workers > 1:
+        strip = rng.random((64, 4096)) * 255.0
+        start = time.perf_counter()
+        atkinson_dither_wavefront(strip, workers=workers)
+        dither_seconds_per_pixel = (time.perf_counter() - start) / strip.size
+    
+    return {
+        'source_seconds_per_pixel': source_seconds / pixels,
+        'target_seconds_per_pixel': max(render_seconds - sequential_dither_seconds, 0.0) / pixels,
+        'dither_seconds_per_pixel': dither_seconds_per_pixel
+    }
+
+def plan_directory(input_dir, width_in, height_in, cost_model=DEFAULT_COST_MODEL, denoise_radius=0, dither_workers=1):
+    input_files = find_input_files(input_dir)
+    if input_files is None:
+        return False
+    if not input_files:
+        print(f"No supported images found in '{input_dir}'.")
+        return True
+        
+    sizes = resolve_sizes(width_in, height_in)
+    jobs = collect_jobs(input_files)
+    estimates = estimate_jobs(jobs, sizes, cost_model, denoise_radius, dither_workers)
+    
+    print(f"Plan for '{input_dir}' ({len(jobs)} jobs, longest first):")
+    total_seconds = 0.0
+    peak_bytes = 0
+    for (input_path, frame, frame_count), estimate in sorted(zip(jobs, estimates), key=lambda j: -(j[1]['seconds'] if j[1] else -1.0)):
+        label = f"{input_path} [frame {frame + 1}/{frame_count}]" if frame is not None else input_path
+        if estimate is None:
+            print(f"  {label}: unreadable header, will fail when processed")
+            continue
+        source_w, source_h = estimate['source_size']
+        targets = ", ".join(f"{tw}x{th}" for tw, th in estimate['targets'])
+        print(f"  {label}: source {source_w}x{source_h} ({estimate['source_px'] / 1e6:.1f} MP) -> {targets} ({estimate['target_px'] / 1e6:.1f} MP), ~{estimate['memory_bytes'] / 2**20:.0f} MB peak, ~{format_duration(estimate['seconds'])}")
+        total_seconds += estimate['seconds']
+        peak_bytes = max(peak_bytes, estimate['memory_bytes'])
+        
+    print(f"Predicted total: ~{format_duration(total_seconds)} sequential, ~{peak_bytes / 2**20:.0f} MB peak memory per worker.")
+    return True
+
 def process_directory(
     input_dir, 
     output_dir, 
@@ -417,39 +1502,48 @@ def process_directory(
     sharpen_threshold,
     circle_cut,
     heart_cut,
-    preset_name
+    preset_name,
+    autocrop=False,
+    head_speed=10.0,
+    line_interval=300,
+    dedup=False,
+    queue_dir=None,
+    worker_id=None,
+    lease_seconds=600,
+    run_log=None,
+    records=None,
+    dither_workers=1
 ):
     print(f"Starting batch process for '{input_dir}'...")
     os.makedirs(output_dir, exist_ok=True)
     
-    supported_extensions = ('.png', '.jpg', '.jpeg', '.bmp')
-    
-    if not os.path.exists(input_dir):
-        print(f"Error: Input path '{input_dir}' does not exist.", file=sys.stderr)
+    input_files = find_input_files(input_dir)
+    if input_files is None:
         return False
-        
-    if not os.path.isdir(input_dir):
-        if input_dir.lower().endswith(supported_extensions):
-            input_files = [input_dir]
-        else:
-            print(f"Error: Input path '{input_dir}' is not a directory or supported image file.", file=sys.stderr)
-            return False
-    else:
-        input_files = []
-        for root, _, filenames in os.walk(input_dir):
-            for f in filenames:
-                if f.lower().endswith(supported_extensions):
-                    input_files.append(os.path.join(root, f))
-    
     if not input_files:
         print(f"No supported images found in '{input_dir}'.")
         return True
 
+    sizes = resolve_sizes(width_in, height_in)
+    dedup_store = load_dedup_store(output_dir) if dedup else None
+    queue = open_work_queue(queue_dir, worker_id, lease_seconds) if queue_dir else None
+    
+    jobs = collect_jobs(input_files)
+    if queue is not None:
+        # Workers pull jobs in this order, so the biggest files start first instead of finishing the batch last
+        jobs = schedule_largest_first(jobs, sizes)
+    
+    # The multi-frame source currently being walked, kept open so consecutive frames seek forward
+    source_path, source = None, None
+    
     success = True
-    for input_path in input_files:
+    for input_path, frame, frame_count in jobs:
         filename = os.path.basename(input_path)
         name, ext = os.path.splitext(filename)
         ext_clean = ext.lstrip('.').lower()
+        frame_suffix = f"_f{frame:0{len(str(frame_count - 1))}d}" if frame is not None else ""
+        if frame is not None:
+            filename = f"{filename} [frame {frame + 1}/{frame_count}]"
         
         # Build settings tags for collision-resistance
         settings = []
@@ -480,6 +1574,8 @@ def process_directory(
                 settings.append("cc" if circle_cut else "nocc")
             if heart_cut != preset_dict.get('heart_cut', DEFAULTS['heart_cut']):
                 settings.append("hc" if heart_cut else "nohc")
+            if autocrop != preset_dict.get('autocrop', DEFAULTS['autocrop']):
+                settings.append("ac" if autocrop else "noac")
         else:
             if black_thresh != DEFAULTS['black_threshold']:
                 settings.append(f"b{black_thresh}")
@@ -505,37 +1601,26 @@ def process_directory(
                 settings.append("cc")
             if heart_cut != DEFAULTS['heart_cut']:
                 settings.append("hc")
+            if autocrop != DEFAULTS['autocrop']:
+                settings.append("ac")
                 
         if not settings:
             settings_str = "dithered"
         else:
             settings_str = "_".join(settings)
         
-        dim_suffix = ""
-        if width_in or height_in:
+        # Every requested size shares one decode, so the header is read once for all dimension suffixes
+        orig_size = None
+        if any(w or h for w, h in sizes):
             try:
-                with Image.open(input_path) as img:
-                    orig_w, orig_h = img.size
-                
-                final_w_in = width_in
-                final_h_in = height_in
-                
-                if final_w_in and not final_h_in:
-                    final_h_in = round((orig_h / orig_w) * final_w_in, 2)
-                elif final_h_in and not final_w_in:
-                    final_w_in = round((orig_w / orig_h) * final_h_in, 2)
-                
-                fw = int(final_w_in) if final_w_in == int(final_w_in) else final_w_in
-                fh = int(final_h_in) if final_h_in == int(final_h_in) else final_h_in
-                    
-                dim_suffix = f"_w{fw}h{fh}"
+                if frame is not None:
+                    source_path, source = open_frame(input_path, frame, source_path, source)
+                    orig_size = source.size
+                else:
+                    with Image.open(input_path) as img:
+                        orig_size = img.size
             except Exception as e:
                 print(f"Error reading {filename} for dimensions: {e}", file=sys.stderr)
-                fw = width_in if width_in else "auto"
-                fh = height_in if height_in else "auto"
-                dim_suffix = f"_w{fw}h{fh}"
-
-        output_filename = f"{name}_{ext_clean}_{settings_str}{dim_suffix}.png"
         
         # Reconstruct directory structure under output_dir
         cwd = os.getcwd()
@@ -557,12 +1642,50 @@ def process_directory(
             else:
                 target_dir = output_dir
                 
-        output_path = os.path.join(target_dir, output_filename)
+        outputs = [
+            (os.path.join(target_dir, f"{name}_{ext_clean}_{settings_str}{dim_suffix_for(w, h, orig_size)}{frame_suffix}.png"), w, h)
+            for w, h in sizes
+        ]
+        output_paths = [output_path for output_path, _, _ in outputs]
         
+        if queue is not None:
+            key = job_key(output_dir, *output_paths)
+            if key in queue['completed']:
+                print(f"Skipping {filename}: already completed.")
+                continue
+            if not claim_job(queue, key):
+                print(f"Skipping {filename}: claimed by another worker.")
+                continue
+            # Another worker may have finished it between our last journal read and the claim
+            if key in refresh_completed(queue):
+                release_job(queue, key)
+                print(f"Skipping {filename}: already completed.")
+                continue
+            stop_heartbeat = start_lease_heartbeat(queue, key)
+        
+        record = {
+            'input': input_path,
+            'frame': frame,
+            'input_bytes': None,
+            'width': None,
+            'height': None,
+            'outputs': [],
+            'output_bytes': None,
+            'preset': preset_name,
+            'duration': None,
+            'error': None
+        }
+        file_start = time.time()
         try:
-            prep_for_glowforge(
+            # Frames share their file's bytes evenly so run totals still add up to the input size
+            record['input_bytes'] = os.path.getsize(input_path) // frame_count
+            frame_img = None
+            if frame is not None:
+                source_path, source = open_frame(input_path, frame, source_path, source)
+                frame_img = source
+            result = prep_sizes_for_glowforge(
                 input_path, 
-                output_path, 
+                outputs, 
                 black_thresh=black_thresh, 
                 white_thresh=white_thresh, 
                 dither_thresh=dither_thresh, 
@@ -570,8 +1693,6 @@ def process_directory(
                 clean_solids_black=clean_solids_black,
                 clean_solids_white=clean_solids_white,
                 invert=invert, 
-                width_in=width_in, 
-                height_in=height_in, 
                 no_border=no_border,
                 denoise_radius=denoise_radius,
                 contrast=contrast,
@@ -579,11 +1700,40 @@ def process_directory(
                 sharpen_percent=sharpen_percent,
                 sharpen_threshold=sharpen_threshold,
                 circle_cut=circle_cut,
-                heart_cut=heart_cut
+                heart_cut=heart_cut,
+                autocrop=autocrop,
+                head_speed=head_speed,
+                line_interval=line_interval,
+                dedup_store=dedup_store,
+                img=frame_img,
+                dither_workers=dither_workers
             )
+            record.update(result)
+            if queue is not None:
+                if stop_heartbeat():
+                    complete_job(queue, key, [os.path.relpath(p, output_dir) for p in output_paths])
+                else:
+                    # The worker that took the lease over journals the file; ours only duplicated the work
+                    print(f"Warning: {filename} was not journaled because its lease was taken over.", file=sys.stderr)
         except Exception as e:
             print(f"Error processing {filename}: {e}", file=sys.stderr)
+            record['error'] = str(e)
             success = False
+        finally:
+            if queue is not None:
+                stop_heartbeat()
+                release_job(queue, key)
+                
+        record['duration'] = round(time.time() - file_start, 4)
+        if records is not None:
+            records.append(record)
+        if run_log is not None:
+            log_record(run_log, record)
+            
+    if source is not None:
+        source.close()
+    if dedup_store is not None:
+        save_dedup_store(dedup_store)
             
     return success
 
@@ -600,8 +1750,8 @@ if __name__ == "__main__":
     parser.add_argument('--clean-solids-black', type=threshold_type, default=None, help="Black cutoff limit for snapping near-solids when using --clean-solids (default: 35).")
     parser.add_argument('--clean-solids-white', type=threshold_type, default=None, help="White cutoff limit for snapping near-solids when using --clean-solids (default: 220).")
     parser.add_argument('-i', '--invert', action='store_true', default=None, help="Invert the black and white values of the image.")
-    parser.add_argument('-w', '--width', type=positive_float_type, default=None, help="Target physical width in inches (calculated at 300 DPI).")
-    parser.add_argument('-h', '--height', type=positive_float_type, default=None, help="Target physical height in inches (calculated at 300 DPI).")
+    parser.add_argument('-w', '--width', type=positive_float_type, nargs='+', default=None, help="Target physical width(s) in inches (calculated at 300 DPI). Several values produce one output per size from a single decode.")
+    parser.add_argument('-h', '--height', type=positive_float_type, nargs='+', default=None, help="Target physical height(s) in inches (calculated at 300 DPI). Several values produce one output per size from a single decode.")
     parser.add_argument('--nb', '--no-border', dest='no_border', action='store_true', default=None, help="Disable the automatic 1px black border.")
     parser.add_argument('--denoise', type=odd_int_type, default=None, help="Denoise image using median filter of specified size (must be odd integer >= 3).")
     parser.add_argument('--contrast', type=positive_float_type, default=None, help="Contrast enhancement factor (default: 1.5).")
@@ -610,6 +1760,17 @@ if __name__ == "__main__":
     parser.add_argument('--sharpen-threshold', type=non_negative_int_type, default=None, help="Sharpening threshold for unsharp mask (default: 3).")
     parser.add_argument('--circle-cut', action='store_true', default=None, help="Apply circular cutout mask and border (useful for coasters).")
     parser.add_argument('--heart-cut', action='store_true', default=None, help="Apply heart cutout mask and border (useful for custom coasters).")
+    parser.add_argument('--autocrop', action='store_true', default=None, help="Trim fully white margins, keeping the border or cut outline.")
+    parser.add_argument('--head-speed', type=positive_float_type, default=DEFAULTS['head_speed'], help="Laser head speed in inches per second used for the engrave time estimate (default: 10.0).")
+    parser.add_argument('--line-interval', type=positive_int_type, default=DEFAULTS['line_interval'], help="Engrave line interval in lines per inch used for the engrave time estimate (default: 300).")
+    parser.add_argument('--dither-workers', type=positive_int_type, default=1, help="Dither a single image on this many processes using a row wavefront, capped at the CPU count (output is identical). Experimental: check the speedup on your machine with --plan.")
+    parser.add_argument('--dedup', action='store_true', help=f"Hard-link byte-identical outputs to a single stored copy and record content hashes in {MANIFEST_FILENAME}.")
+    parser.add_argument('--queue-dir', type=str, default=None, help="Shared folder used to coordinate several workers (e.g. on an NFS share) processing the same input.")
+    parser.add_argument('--worker-id', type=str, default=None, help="Unique name of this worker in --queue-dir mode (default: hostname-pid).")
+    parser.add_argument('--lease-seconds', type=positive_int_type, default=600, help="Seconds a claimed file stays leased without renewal before other workers may take it over; renewed while processing (default: 600).")
+    parser.add_argument('--plan', action='store_true', help="Preflight only: read image headers and print per-file pixel counts, predicted peak memory and time (calibrated on this machine), then exit.")
+    parser.add_argument('--log-json', type=str, default=None, help="Append one JSON line per processed file (path, sizes, dimensions, preset, duration, error) to this file.")
+    parser.add_argument('--metrics-file', type=str, default=None, help="Write run counters and a per-file latency histogram to this Prometheus textfile-collector file (*.prom).")
     
     args = parser.parse_args()
     
@@ -631,6 +1792,7 @@ if __name__ == "__main__":
     sharpen_threshold = args.sharpen_threshold if args.sharpen_threshold is not None else preset_dict.get('sharpen_threshold', DEFAULTS['sharpen_threshold'])
     circle_cut = args.circle_cut if args.circle_cut is not None else preset_dict.get('circle_cut', DEFAULTS['circle_cut'])
     heart_cut = args.heart_cut if args.heart_cut is not None else preset_dict.get('heart_cut', DEFAULTS['heart_cut'])
+    autocrop = args.autocrop if args.autocrop is not None else preset_dict.get('autocrop', DEFAULTS['autocrop'])
     
     if circle_cut and heart_cut:
         parser.error("Cannot apply both circular cutout (--circle-cut) and heart cutout (--heart-cut) simultaneously.")
@@ -638,6 +1800,43 @@ if __name__ == "__main__":
         parser.error(f"Resolved Black threshold ({black_thresh}) cannot be greater than white threshold ({white_thresh}).")
     if clean_solids_black > clean_solids_white:
         parser.error(f"Resolved Clean solids black limit ({clean_solids_black}) cannot be greater than white limit ({clean_solids_white}).")
+    try:
+        resolve_sizes(args.width, args.height)
+    except ValueError as e:
+        parser.error(str(e))
+    if effective_dither_workers(args.dither_workers) < args.dither_workers:
+        print(f"Note: --dither-workers {args.dither_workers} capped at {effective_dither_workers(args.dither_workers)} (CPU count).")
+    
+    if args.plan:
+        cost_model = calibrate_cost_model(
+            denoise_radius=denoise_radius,
+            dither_workers=args.dither_workers,
+            black_thresh=black_thresh,
+            white_thresh=white_thresh,
+            dither_thresh=dither_thresh,
+            clean_solids=clean_solids,
+            clean_solids_black=clean_solids_black,
+            clean_solids_white=clean_solids_white,
+            invert=invert,
+            no_border=no_border,
+            contrast=contrast,
+            sharpen_radius=sharpen_radius,
+            sharpen_percent=sharpen_percent,
+            sharpen_threshold=sharpen_threshold,
+            circle_cut=circle_cut,
+            heart_cut=heart_cut,
+            autocrop=autocrop
+        )
+        print(f"Calibrated cost: {cost_model['source_seconds_per_pixel'] * 1e6:.3f} us per source pixel, {(cost_model['target_seconds_per_pixel'] + cost_model['dither_seconds_per_pixel']) * 1e6:.3f} us per output pixel ({cost_model['dither_seconds_per_pixel'] * 1e6:.3f} us of it dithering).")
+        plan_success = True
+        for input_path in args.input:
+            if not plan_directory(input_path, args.width, args.height, cost_model, denoise_radius, args.dither_workers):
+                plan_success = False
+        sys.exit(0 if plan_success else 1)
+    
+    run_started = time.time()
+    records = []
+    run_log = open(args.log_json, 'a') if args.log_json else None
     
     all_success = True
     for input_path in args.input:
@@ -661,9 +1860,24 @@ if __name__ == "__main__":
             sharpen_threshold,
             circle_cut,
             heart_cut,
-            args.preset
+            args.preset,
+            autocrop=autocrop,
+            head_speed=args.head_speed,
+            line_interval=args.line_interval,
+            dedup=args.dedup,
+            queue_dir=args.queue_dir,
+            worker_id=args.worker_id,
+            lease_seconds=args.lease_seconds,
+            run_log=run_log,
+            records=records,
+            dither_workers=args.dither_workers
         ):
             all_success = False
             
+    if run_log is not None:
+        run_log.close()
+    if args.metrics_file:
+        write_prometheus_textfile(args.metrics_file, records, run_started)
+            
     if not all_success:
         sys.exit(1)
@@ -1,10 +1,15 @@
 import os
 import io
+import json
+import sys
+import time
+import subprocess
 import argparse
 import pytest
-from PIL import Image, ImageDraw, ImageOps
+from PIL import Image, ImageDraw, ImageOps, ImageEnhance, ImageFilter
 import numpy as np
 
+import main
 from main import (
     threshold_type,
     positive_float_type,
@@ -12,6 +17,33 @@ from main import (
     positive_int_type,
     non_negative_int_type,
     transform_image,
+    analyze_bitmap,
+    process_directory,
+    MANIFEST_FILENAME,
+    MANIFEST_LOCK_FILENAME,
+    save_dedup_store,
+    JOURNAL_DIRNAME,
+    open_work_queue,
+    claim_job,
+    release_job,
+    complete_job,
+    start_lease_heartbeat,
+    write_prometheus_textfile,
+    resolve_sizes,
+    count_frames,
+    atkinson_dither,
+    atkinson_dither_wavefront,
+    wavefront_block_for,
+    WAVEFRONT_BLOCK,
+    effective_dither_workers,
+    collect_jobs,
+    estimate_jobs,
+    schedule_largest_first,
+    plan_directory,
+    RENDER_BYTES_PER_PIXEL,
+    WAVEFRONT_RENDER_BYTES_PER_PIXEL,
+    calibrate_cost_model,
+    render_bitmap,
 )
 
 def test_threshold_type_valid():
@@ -188,25 +220,533 @@ def test_circle_cutout_mask():
     img = Image.new('RGB', (16, 16), (255, 0, 0))
     processed = transform_image(img, circle_cut=True, no_border=True)
     
-    # Verify the output is in RGBA mode
-    assert processed.mode == 'RGBA'
+    # Verify the output is a compact palette image with a transparent index
+    assert processed.mode == 'P'
+    assert 'transparency' in processed.info
+    rgba = processed.convert('RGBA')
     
     # Center pixel (8, 8) is inside circle -> opaque (alpha=255)
     # Corner pixel (0, 0) is outside circle -> transparent (alpha=0)
-    assert processed.getpixel((8, 8))[3] == 255
-    assert processed.getpixel((0, 0))[3] == 0
+    assert rgba.getpixel((8, 8))[3] == 255
+    assert rgba.getpixel((0, 0))[3] == 0
 
 def test_heart_cutout_mask():
     # Create a 16x16 image
     img = Image.new('RGB', (16, 16), (255, 0, 0))
     processed = transform_image(img, heart_cut=True, no_border=True)
     
-    # Verify the output is in RGBA mode
-    assert processed.mode == 'RGBA'
+    # Verify the output is a compact palette image with a transparent index
+    assert processed.mode == 'P'
+    rgba = processed.convert('RGBA')
     
     # Center pixel (8, 8) is inside heart -> opaque (alpha=255)
     # Bottom-left corner pixel (0, 15) is outside heart -> transparent (alpha=0)
-    assert processed.getpixel((8, 8))[3] == 255
-    assert processed.getpixel((0, 15))[3] == 0
+    assert rgba.getpixel((8, 8))[3] == 255
+    assert rgba.getpixel((0, 15))[3] == 0
 
+def test_cutout_saved_as_2bit_png():
+    img = Image.new('L', (64, 64))
+    img.putdata([(x * 4) % 256 for y in range(64) for x in range(64)])
+    processed = transform_image(img, circle_cut=True)
+    
+    buf = io.BytesIO()
+    processed.save(buf, format='PNG')
+    data = buf.getvalue()
+    # IHDR bit depth byte: 2 bits per pixel, colour type 3 (palette)
+    assert data[24] == 2 and data[25] == 3
+    
+    # Same visible result as the 1-bit bitmap inside the circle, outline pixels black, outside transparent
+    reloaded = Image.open(io.BytesIO(data)).convert('RGBA')
+    plain = transform_image(img, no_border=True).convert('RGBA')
+    assert reloaded.getpixel((32, 32)) == plain.getpixel((32, 32))
+    assert reloaded.getpixel((32, 0)) == (0, 0, 0, 255)
+    assert reloaded.getpixel((0, 0))[3] == 0
+    assert analyze_bitmap(processed)['dark_pixels'] < 64 * 64
+
+def test_analyze_bitmap_estimate():
+    # 300x150 px (1" x 0.5") with a single black row
+    img = Image.new('1', (300, 150), 1)
+    ImageDraw.Draw(img).line([0, 10, 299, 10], fill=0)
+    stats = analyze_bitmap(img, head_speed=2.0, line_interval=100)
+    assert stats['dark_pixels'] == 300
+    assert stats['active_rows'] == 1
+    assert stats['coverage'] == pytest.approx(1 / 150)
+    # 50 scan lines, each sweeping 1" at 2 in/s
+    assert stats['scan_lines'] == 50
+    assert stats['estimated_seconds'] == pytest.approx(25.0)
+
+def test_autocrop_trims_white_margins():
+    img = Image.new('L', (40, 30), 255)
+    ImageDraw.Draw(img).rectangle([10, 5, 19, 14], fill=0)
+    
+    cropped = transform_image(img, autocrop=True, no_border=True)
+    assert cropped.size == (10, 10)
+    assert not np.array(cropped).any()
+    
+    # With a border, a 1px margin is kept so the outline does not overwrite the content
+    bordered = transform_image(img, autocrop=True)
+    assert bordered.size == (12, 12)
+
+def test_autocrop_keeps_circle_cut_outline():
+    img = Image.new('RGB', (40, 20), (255, 255, 255))
+    processed = transform_image(img, circle_cut=True, autocrop=True)
+    assert processed.size == (20, 20)
+    assert processed.convert('RGBA').getpixel((10, 0)) == (0, 0, 0, 255)
+
+def run_batch(input_dir, output_dir, preset_name=None, **kwargs):
+    return process_directory(
+        str(input_dir), str(output_dir),
+        0, 255, 128, False, 35, 220, False, None, None, False,
+        0, 1.5, 2.0, 150, 3, False, False, preset_name,
+        **kwargs
+    )
+
+def test_dedup_links_identical_outputs(tmp_path):
+    input_dir = tmp_path / "input"
+    output_dir = tmp_path / "output"
+    input_dir.mkdir()
+    img = Image.new('L', (12, 12), 90)
+    img.save(input_dir / "first.png")
+    img.save(input_dir / "second.png")
+    Image.new('L', (12, 12), 200).save(input_dir / "other.png")
+    
+    assert run_batch(input_dir, output_dir, dedup=True)
+    
+    first = output_dir / "first_png_dithered.png"
+    second = output_dir / "second_png_dithered.png"
+    other = output_dir / "other_png_dithered.png"
+    assert os.path.samefile(first, second)
+    assert not os.path.samefile(first, other)
+    
+    with open(output_dir / MANIFEST_FILENAME) as f:
+        manifest = json.load(f)
+    assert manifest["first_png_dithered.png"] == manifest["second_png_dithered.png"]
+    assert manifest["other_png_dithered.png"] != manifest["first_png_dithered.png"]
+    
+    # Re-running must not write through the shared inode
+    Image.new('L', (12, 12), 250).save(input_dir / "second.png")
+    assert run_batch(input_dir, output_dir, dedup=True)
+    assert not os.path.samefile(first, second)
+    assert not np.array_equal(np.array(Image.open(first)), np.array(Image.open(second)))
+
+def test_dedup_does_not_link_stale_target(tmp_path):
+    input_dir = tmp_path / "input"
+    other_dir = tmp_path / "other"
+    output_dir = tmp_path / "output"
+    input_dir.mkdir()
+    other_dir.mkdir()
+    original = Image.new('L', (12, 12), 90)
+    original.save(input_dir / "a.png")
+    original.save(other_dir / "b.png")
+    
+    assert run_batch(input_dir, output_dir, dedup=True)
+    # A run without --dedup overwrites the output but leaves the manifest entry behind
+    Image.new('L', (12, 12), 200).save(input_dir / "a.png")
+    assert run_batch(input_dir, output_dir)
+    assert run_batch(other_dir, output_dir, dedup=True)
+    
+    a_out = output_dir / "a_png_dithered.png"
+    b_out = output_dir / "b_png_dithered.png"
+    assert not os.path.samefile(a_out, b_out)
+    assert np.array_equal(np.array(Image.open(b_out)), np.array(transform_image(original)))
+    # The manifest now records what a's output really holds
+    with open(output_dir / MANIFEST_FILENAME) as f:
+        manifest = json.load(f)
+    assert manifest["a_png_dithered.png"] != manifest["b_png_dithered.png"]
+
+def test_dedup_manifest_concurrent_saves(tmp_path):
+    import threading
+    # A crashed worker's leftover lock must not block saving
+    with open(tmp_path / MANIFEST_LOCK_FILENAME, "w") as f:
+        json.dump({"holder": "crashed", "time": time.time() - 3600}, f)
+        
+    def save(n):
+        for i in range(10):
+            rel_path = f"w{n}_{i}.png"
+            store = {"root": str(tmp_path), "files": {rel_path: f"{n}-{i}"}, "by_hash": {}, "written": {rel_path}}
+            save_dedup_store(store)
+            
+    threads = [threading.Thread(target=save, args=(n,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+        
+    # No worker's entries were lost to another's read-merge-replace
+    with open(tmp_path / MANIFEST_FILENAME) as f:
+        assert len(json.load(f)) == 40
+    assert os.listdir(tmp_path) == [MANIFEST_FILENAME]
+
+def test_work_queue_lease_expiry(tmp_path):
+    worker_a = open_work_queue(str(tmp_path), worker_id="a", lease_seconds=60)
+    worker_b = open_work_queue(str(tmp_path), worker_id="b", lease_seconds=60)
+    
+    assert claim_job(worker_a, "job")
+    assert not claim_job(worker_b, "job")
+    # A restarted worker with the same id resumes its own lease
+    assert claim_job(worker_a, "job")
+    
+    # Simulate a crashed worker whose lease has expired
+    with open(tmp_path / "leases" / "job.lease", "w") as f:
+        json.dump({"worker": "a", "expires": time.time() - 1}, f)
+    assert claim_job(worker_b, "job")
+    assert not claim_job(worker_a, "job")
+    
+    # Only the owner can release
+    release_job(worker_a, "job")
+    assert not claim_job(worker_a, "job")
+    release_job(worker_b, "job")
+    assert claim_job(worker_a, "job")
+
+def test_work_queue_worker_id_with_path_separator(tmp_path):
+    worker = open_work_queue(str(tmp_path), worker_id="rack1/node 2")
+    assert worker["worker_id"] == "rack1_node_2"
+    assert claim_job(worker, "job")
+    complete_job(worker, "job", ["out.png"])
+    assert os.listdir(tmp_path / JOURNAL_DIRNAME) == ["rack1_node_2.jsonl"]
+    release_job(worker, "job")
+    assert os.listdir(tmp_path / "leases") == []
+
+def test_work_queue_lease_heartbeat(tmp_path):
+    worker_a = open_work_queue(str(tmp_path), worker_id="a", lease_seconds=0.3)
+    worker_b = open_work_queue(str(tmp_path), worker_id="b", lease_seconds=0.3)
+    
+    assert claim_job(worker_a, "job")
+    stop_heartbeat = start_lease_heartbeat(worker_a, "job")
+    # Outlive the lease several times over; the heartbeat keeps it fresh
+    time.sleep(1.0)
+    assert not claim_job(worker_b, "job")
+    assert stop_heartbeat()
+    release_job(worker_a, "job")
+    assert claim_job(worker_b, "job")
+    
+    # Without a heartbeat the lease lapses and can be taken over
+    time.sleep(0.4)
+    assert claim_job(worker_a, "job")
+
+def test_work_queue_lost_lease_is_reported(tmp_path):
+    worker_a = open_work_queue(str(tmp_path), worker_id="a", lease_seconds=0.3)
+    assert claim_job(worker_a, "job")
+    stop_heartbeat = start_lease_heartbeat(worker_a, "job")
+    # Another worker takes the lease over while "a" is still working
+    with open(tmp_path / "leases" / "job.lease", "w") as f:
+        json.dump({"worker": "b", "expires": time.time() + 60}, f)
+    time.sleep(0.5)
+    assert not stop_heartbeat()
+    assert not stop_heartbeat()
+    with open(tmp_path / "leases" / "job.lease") as f:
+        assert json.load(f)["worker"] == "b"
+
+def test_work_queue_multiple_processes(tmp_path):
+    input_dir = tmp_path / "input"
+    output_dir = tmp_path / "output"
+    queue_dir = tmp_path / "queue"
+    input_dir.mkdir()
+    for i in range(8):
+        Image.new('L', (24, 24), i * 30).save(input_dir / f"img{i}.png")
+        
+    main_py = os.path.join(os.path.dirname(__file__), "..", "main.py")
+    workers = [
+        subprocess.Popen(
+            [sys.executable, main_py, "--input", str(input_dir), "-o", str(output_dir), "--queue-dir", str(queue_dir), "--worker-id", f"w{n}"],
+            stdout=subprocess.DEVNULL
+        )
+        for n in range(3)
+    ]
+    assert all(worker.wait(timeout=120) == 0 for worker in workers)
+    
+    def journal_entries():
+        entries = []
+        for name in os.listdir(queue_dir / JOURNAL_DIRNAME):
+            with open(queue_dir / JOURNAL_DIRNAME / name) as f:
+                for line in f:
+                    entry = json.loads(line)
+                    # Each worker journals only to its own file
+                    assert name == f"{entry['worker']}.jsonl"
+                    entries.append(entry)
+        return entries
+
+    entries = journal_entries()
+    # Every file was processed exactly once across all workers
+    assert len(entries) == 8
+    assert len({entry["key"] for entry in entries}) == 8
+    assert sorted(os.listdir(output_dir)) == sorted(f"img{i}_png_dithered.png" for i in range(8))
+    assert os.listdir(queue_dir / "leases") == []
+    
+    # A rerun resumes from the journal and does no work
+    subprocess.run(
+        [sys.executable, main_py, "--input", str(input_dir), "-o", str(output_dir), "--queue-dir", str(queue_dir)],
+        check=True, stdout=subprocess.DEVNULL
+    )
+    assert len(journal_entries()) == 8
+
+def test_run_records_and_json_log(tmp_path):
+    input_dir = tmp_path / "input"
+    input_dir.mkdir()
+    Image.new('L', (20, 10), 100).save(input_dir / "good.png")
+    (input_dir / "broken.png").write_bytes(b"not an image")
+    
+    records = []
+    with open(tmp_path / "run.jsonl", "w") as run_log:
+        assert not run_batch(input_dir, tmp_path / "output", run_log=run_log, records=records)
+        
+    with open(tmp_path / "run.jsonl") as f:
+        logged = [json.loads(line) for line in f]
+    assert len(logged) == len(records) == 2
+    
+    by_name = {os.path.basename(r["input"]): r for r in logged}
+    good = by_name["good.png"]
+    assert (good["width"], good["height"]) == (20, 10)
+    assert good["input_bytes"] == os.path.getsize(input_dir / "good.png")
+    assert good["output_bytes"] == os.path.getsize(good["outputs"][0]["path"])
+    assert good["duration"] >= 0 and good["error"] is None
+    assert by_name["broken.png"]["error"]
 
+def test_prometheus_textfile(tmp_path):
+    records = [
+        {"input_bytes": 100, "output_bytes": 40, "duration": 0.3, "error": None},
+        {"input_bytes": 50, "output_bytes": None, "duration": 7.0, "error": "boom"},
+    ]
+    path = tmp_path / "glowforge.prom"
+    write_prometheus_textfile(str(path), records, time.time())
+    metrics = dict(
+        line.rsplit(" ", 1) for line in path.read_text().splitlines() if not line.startswith("#")
+    )
+    assert metrics["glowforge_files_processed_total"] == "1"
+    assert metrics["glowforge_files_failed_total"] == "1"
+    assert metrics["glowforge_input_bytes_total"] == "150"
+    assert metrics["glowforge_output_bytes_total"] == "40"
+    assert metrics['glowforge_file_duration_seconds_bucket{le="0.5"}'] == "1"
+    assert metrics['glowforge_file_duration_seconds_bucket{le="10.0"}'] == "2"
+    assert metrics['glowforge_file_duration_seconds_bucket{le="+Inf"}'] == "2"
+    assert metrics["glowforge_file_duration_seconds_count"] == "2"
+    
+    # A second run adds to the counters instead of resetting them
+    write_prometheus_textfile(str(path), records[:1], time.time())
+    metrics = dict(
+        line.rsplit(" ", 1) for line in path.read_text().splitlines() if not line.startswith("#")
+    )
+    assert metrics["glowforge_files_processed_total"] == "2"
+    assert metrics["glowforge_files_failed_total"] == "1"
+    assert metrics["glowforge_input_bytes_total"] == "250"
+    assert metrics['glowforge_file_duration_seconds_bucket{le="0.5"}'] == "2"
+    assert metrics['glowforge_file_duration_seconds_bucket{le="+Inf"}'] == "3"
+    assert metrics["glowforge_file_duration_seconds_sum"] == "7.6"
+
+def test_resolve_sizes():
+    assert resolve_sizes(None, None) == [(None, None)]
+    assert resolve_sizes([3.0, 4.0, 5.0], None) == [(3.0, None), (4.0, None), (5.0, None)]
+    assert resolve_sizes([3.0, 4.0], [2.0]) == [(3.0, 2.0), (4.0, 2.0)]
+    assert resolve_sizes([3.0, 4.0], [2.0, 3.0]) == [(3.0, 2.0), (4.0, 3.0)]
+    assert resolve_sizes([3.0, 3.0], None) == [(3.0, None)]
+    with pytest.raises(ValueError):
+        resolve_sizes([3.0, 4.0], [1.0, 2.0, 3.0])
+
+def test_multi_size_single_decode(tmp_path, monkeypatch):
+    import main
+    input_dir = tmp_path / "input"
+    output_dir = tmp_path / "output"
+    input_dir.mkdir()
+    Image.new('L', (60, 30), 120).save(input_dir / "design.png")
+    
+    calls = []
+    original = main.prepare_grayscale
+    monkeypatch.setattr(main, "prepare_grayscale", lambda *a, **k: calls.append(1) or original(*a, **k))
+    
+    records = []
+    assert process_directory(
+        str(input_dir), str(output_dir),
+        0, 255, 128, False, 35, 220, False, [0.1, 0.2], None, False,
+        0, 1.5, 2.0, 150, 3, False, False, None,
+        records=records
+    )
+    assert len(calls) == 1
+    assert sorted(os.listdir(output_dir)) == ["design_png_dithered_w0.1h0.05.png", "design_png_dithered_w0.2h0.1.png"]
+    assert Image.open(output_dir / "design_png_dithered_w0.2h0.1.png").size == (60, 30)
+    assert Image.open(output_dir / "design_png_dithered_w0.1h0.05.png").size == (30, 15)
+    assert [o["width"] for o in records[0]["outputs"]] == [30, 60]
+    
+    # Each size matches what a separate single-size run produces
+    single = transform_image(Image.open(input_dir / "design.png"), width_in=0.1)
+    assert np.array_equal(np.array(single), np.array(Image.open(output_dir / "design_png_dithered_w0.1h0.05.png")))
+
+def test_multi_frame_tiff_outputs_per_frame(tmp_path):
+    input_dir = tmp_path / "input"
+    output_dir = tmp_path / "output"
+    input_dir.mkdir()
+    pages = [Image.new('L', (8 + i, 8), 255 if i % 2 else 0) for i in range(12)]
+    pages[0].save(input_dir / "sheet.tiff", save_all=True, append_images=pages[1:])
+    Image.new('L', (8, 8), 0).save(input_dir / "single.tif")
+    assert count_frames(str(input_dir / "sheet.tiff")) == 12
+    assert count_frames(str(input_dir / "single.tif")) == 1
+    
+    records = []
+    assert run_batch(input_dir, output_dir, records=records)
+    
+    names = sorted(os.listdir(output_dir))
+    assert "single_tif_dithered.png" in names
+    assert [n for n in names if n.startswith("sheet")] == [f"sheet_tiff_dithered_f{i:02d}.png" for i in range(12)]
+    for i in range(12):
+        out = Image.open(output_dir / f"sheet_tiff_dithered_f{i:02d}.png")
+        assert out.size == (8 + i, 8)
+        # Interior pixels follow the page colour (the border is always black)
+        assert bool(np.array(out)[4, 4]) == bool(i % 2)
+    assert sorted(r["frame"] for r in records if r["frame"] is not None) == list(range(12))
+
+def test_multi_frame_gif_with_size(tmp_path):
+    input_dir = tmp_path / "input"
+    output_dir = tmp_path / "output"
+    input_dir.mkdir()
+    frames = [Image.new('RGB', (30, 30), colour) for colour in ('black', 'white', 'black')]
+    frames[0].save(input_dir / "anim.gif", save_all=True, append_images=frames[1:], duration=100)
+    
+    assert run_batch(input_dir, output_dir)
+    assert sorted(os.listdir(output_dir)) == [f"anim_gif_dithered_f{i}.png" for i in range(3)]
+    assert not np.array(Image.open(output_dir / "anim_gif_dithered_f0.png"))[15, 15]
+    assert np.array(Image.open(output_dir / "anim_gif_dithered_f1.png"))[15, 15]
+
+def test_wavefront_dither_bit_identical():
+    rng = np.random.default_rng(7)
+    img_array = rng.uniform(0, 255, (23, 70))
+    sequential = atkinson_dither(img_array, 128)
+    for workers, block in ((2, 1), (3, 8), (4, 256), (5, None)):
+        parallel = atkinson_dither_wavefront(img_array, 128, workers=workers, block=block)
+        # Compare raw float bits, not just the thresholded output
+        assert np.array_equal(sequential.view(np.uint64), parallel.view(np.uint64))
+
+_real_wavefront_worker = main._atkinson_wavefront_worker
+
+def _failing_wavefront_worker(shared, published, h, w, first_row, *args):
+    # Only the second worker crashes; the others run normally and would wait on its rows
+    if first_row == 1:
+        raise RuntimeError("worker crashed")
+    _real_wavefront_worker(shared, published, h, w, first_row, *args)
+
+def test_wavefront_dither_worker_failure_raises(monkeypatch):
+    monkeypatch.setattr(main, "_atkinson_wavefront_worker", _failing_wavefront_worker)
+    img_array = np.random.default_rng(3).uniform(0, 255, (12, 40))
+    # Rows below the crashed worker's would wait forever; the call must fail instead of hanging
+    start = time.time()
+    with pytest.raises(RuntimeError, match="Wavefront dithering worker failed"):
+        atkinson_dither_wavefront(img_array, 128, workers=3, block=8)
+    assert time.time() - start < 30
+
+def test_wavefront_block_for():
+    assert wavefront_block_for(6000, 8) == WAVEFRONT_BLOCK
+    # Narrow rows get smaller blocks so every worker has a block to work on
+    assert wavefront_block_for(1500, 8) == 94
+    assert wavefront_block_for(100, 8) == 32
+
+def test_transform_image_dither_workers(monkeypatch):
+    # Pretend to have the cores so the wavefront path really runs
+    monkeypatch.setattr(os, "cpu_count", lambda: 4)
+    img = Image.new('L', (40, 16))
+    img.putdata([(x * 7 + y * 13) % 256 for y in range(16) for x in range(40)])
+    assert np.array_equal(np.array(transform_image(img)), np.array(transform_image(img, dither_workers=3)))
+
+def test_effective_dither_workers(monkeypatch):
+    monkeypatch.setattr(os, "cpu_count", lambda: 4)
+    assert effective_dither_workers(1) == 1
+    assert effective_dither_workers(3) == 3
+    assert effective_dither_workers(16) == 4
+    monkeypatch.setattr(os, "cpu_count", lambda: None)
+    assert effective_dither_workers(8) == 1
+
+def test_estimate_jobs_from_headers(tmp_path, monkeypatch):
+    monkeypatch.setattr(os, "cpu_count", lambda: 4)
+    Image.new('RGB', (600, 300)).save(tmp_path / "wide.png")
+    pages = [Image.new('L', (100, 50)), Image.new('L', (40, 20))]
+    pages[0].save(tmp_path / "pages.tiff", save_all=True, append_images=pages[1:])
+    
+    jobs = collect_jobs([str(tmp_path / "wide.png"), str(tmp_path / "pages.tiff")])
+    estimates = estimate_jobs(jobs, [(1.0, None), (2.0, None)])
+    
+    wide = estimates[0]
+    assert wide['source_px'] == 600 * 300
+    assert wide['targets'] == [(300, 150), (600, 300)]
+    assert wide['target_px'] == 300 * 150 + 600 * 300
+    # RGB decodes to 4 bytes per pixel plus the grayscale copy; the largest size drives the render peak
+    assert wide['memory_bytes'] == 600 * 300 * 5 + 600 * 300 * RENDER_BYTES_PER_PIXEL
+    assert [e['source_size'] for e in estimates[1:]] == [(100, 50), (40, 20)]
+    
+    # Denoising keeps the filtered copy alive; the wavefront kernel needs no nested-list copy
+    tuned = estimate_jobs(jobs, [(1.0, None), (2.0, None)], denoise_radius=3, dither_workers=4)[0]
+    assert tuned['memory_bytes'] == 600 * 300 * 6 + 600 * 300 * WAVEFRONT_RENDER_BYTES_PER_PIXEL
+
+def test_calibrate_cost_model_uses_settings():
+    cost_model = calibrate_cost_model(sample_size=32, denoise_radius=3, dither_workers=2, circle_cut=True, contrast=2.0)
+    assert set(cost_model) == {'source_seconds_per_pixel', 'target_seconds_per_pixel', 'dither_seconds_per_pixel'}
+    assert all(value >= 0 for value in cost_model.values())
+    assert cost_model['dither_seconds_per_pixel'] > 0
+
+def test_schedule_largest_first(tmp_path):
+    for name, size in (("small.png", (10, 10)), ("large.png", (200, 100)), ("medium.png", (50, 50))):
+        Image.new('L', size).save(tmp_path / name)
+    (tmp_path / "broken.png").write_bytes(b"not an image")
+    jobs = collect_jobs([str(tmp_path / n) for n in ("small.png", "broken.png", "large.png", "medium.png")])
+    
+    ordered = [os.path.basename(path) for path, _, _ in schedule_largest_first(jobs, [(None, None)])]
+    assert ordered == ["large.png", "medium.png", "small.png", "broken.png"]
+
+def test_plan_directory_reports_without_processing(tmp_path, capsys):
+    Image.new('L', (60, 30)).save(tmp_path / "design.png")
+    assert plan_directory(str(tmp_path), [1.0], None)
+    out = capsys.readouterr().out
+    assert "source 60x30" in out and "300x150" in out
+    assert os.listdir(tmp_path) == ["design.png"]
+
+def test_bilevel_fast_path_matches_full_pipeline():
+    img = Image.new('L', (48, 32), 255)
+    draw = ImageDraw.Draw(img)
+    draw.ellipse([4, 4, 30, 28], outline=0, width=2)
+    draw.line([0, 31, 47, 0], fill=0)
+    
+    report = {}
+    fast = render_bitmap(img, no_border=True, report=report)
+    assert report['bilevel_fast_path']
+    
+    # The stages the fast path skips, run by hand with the default settings
+    slow = ImageEnhance.Contrast(img).enhance(1.5)
+    slow = slow.filter(ImageFilter.UnsharpMask(radius=2.0, percent=150, threshold=3))
+    slow = atkinson_dither(np.array(slow, dtype=float), 128)
+    assert np.array_equal(np.array(fast), slow > 127)
+
+def test_bilevel_fast_path_two_colour_palette():
+    img = Image.new('P', (16, 16), 0)
+    img.putpalette([0, 0, 0, 255, 255, 255])
+    ImageDraw.Draw(img).rectangle([4, 4, 11, 11], fill=1)
+    
+    report = {}
+    processed = transform_image(img, heart_cut=True, report=report)
+    assert report['bilevel_fast_path']
+    assert processed.mode == 'P'
+
+def test_bilevel_fast_path_not_taken():
+    bilevel = Image.new('L', (8, 8), 0)
+    bilevel.putpixel((3, 3), 255)
+    gray = bilevel.copy()
+    gray.putpixel((0, 0), 128)
+    
+    for img, kwargs in ((gray, {}), (bilevel, {'contrast': 0.5}), (bilevel, {'dither_thresh': 255})):
+        report = {}
+        render_bitmap(img, report=report, **kwargs)
+        assert not report['bilevel_fast_path']
+
+def test_outputs_respect_umask(tmp_path):
+    input_dir = tmp_path / "input"
+    output_dir = tmp_path / "output"
+    input_dir.mkdir()
+    img = Image.new('L', (12, 12), 90)
+    img.save(input_dir / "first.png")
+    img.save(input_dir / "second.png")
+    
+    old_umask = os.umask(0o022)
+    try:
+        assert run_batch(input_dir, output_dir, dedup=True)
+    finally:
+        os.umask(old_umask)
+        
+    # Both the freshly written copy and its deduplicated link get the usual 0644, not a temp file's 0600
+    for name in ("first_png_dithered.png", "second_png_dithered.png"):
+        assert os.stat(output_dir / name).st_mode & 0o777 == 0o644
+    assert not [n for n in os.listdir(output_dir) if n.endswith(".tmp")]